@@ -2,7 +2,7 @@
 
 """
 @author: Shankar Ratneshwaran
-@classes:CSV 
+@classes:CSV
 @filename:csv.py
 @description: Dataset download and manipulation class for csv
 the _dataset member holds all the data in a pandas Dataframe
@@ -10,66 +10,483 @@ the _dataset member holds all the data in a pandas Dataframe
 
 
 from ..prep.data import InMemDataset
-import numpy as np
-import pandas as pd
+import logging
 import os
 
+# numpy and pandas are imported inside the methods that parse data:
+# importing pandas alone costs hundreds of ms and tens of MB, which a
+# process using only the download machinery should never pay
+
+""" jitted row parser shared by every CSV instance, built lazily on the
+first load_numeric call so importing this module never compiles numba """
+_parse_rows_kernel = None
+
+""" loaders generated by CSV.specialize, keyed by their schema so the
+same schema is only compiled once per process """
+_specialized_loaders = {}
+
+
+def _build_parse_rows_kernel():
+    """
+    Compiles the numba kernel that parses comma separated floats straight
+    out of the raw byte buffer, one row per parallel iteration.  Kept as
+    a module function so the compile cost is paid once per process
+    """
+    from numba import njit, prange
+
+    @njit(parallel=True, fastmath=True, cache=True)
+    def parse_rows(buf, row_starts, row_ends, out):
+        n_rows = row_starts.shape[0]
+        n_cols = out.shape[1]
+        for i in prange(n_rows):
+            pos = row_starts[i]
+            end = row_ends[i]
+            for c in range(n_cols):
+                while pos < end and buf[pos] == 32:  # spaces
+                    pos += 1
+                sign = 1.0
+                if pos < end and buf[pos] == 45:  # '-'
+                    sign = -1.0
+                    pos += 1
+                elif pos < end and buf[pos] == 43:  # '+'
+                    pos += 1
+                val = 0.0
+                while pos < end and 48 <= buf[pos] <= 57:
+                    val = val * 10.0 + (buf[pos] - 48)
+                    pos += 1
+                if pos < end and buf[pos] == 46:  # '.'
+                    pos += 1
+                    frac = 0.1
+                    while pos < end and 48 <= buf[pos] <= 57:
+                        val += (buf[pos] - 48) * frac
+                        frac *= 0.1
+                        pos += 1
+                if pos < end and (buf[pos] == 101 or buf[pos] == 69):  # e/E
+                    pos += 1
+                    exp_sign = 1
+                    if pos < end and buf[pos] == 45:
+                        exp_sign = -1
+                        pos += 1
+                    elif pos < end and buf[pos] == 43:
+                        pos += 1
+                    exp = 0
+                    while pos < end and 48 <= buf[pos] <= 57:
+                        exp = exp * 10 + (buf[pos] - 48)
+                        pos += 1
+                    val = val * 10.0 ** (exp_sign * exp)
+                out[i, c] = sign * val
+                if pos < end and buf[pos] == 44:  # ','
+                    pos += 1
+
+    return parse_rows
+
+
 class CSV(InMemDataset):
     """
-    CSV class helps with download and manipulation of CSV data.  
-    This class can help with both archived and unarchived csv files 
+    CSV class helps with download and manipulation of CSV data.
+    This class can help with both archived and unarchived csv files
     that could be either already downloaded in a path or not
-        
-    """
-    def __init__(self, source_url, data_file_path, download_path="./data/",  already_downloaded=True, to_be_copied = False):
-        super().__init__(
-            source_url = source_url,
-            training_data_filename = data_file_path
-            download_path = download_path,
-            already_downloaded=True
-            )
 
+    """
+    __slots__ = ("_to_be_copied", "_engine", "_chunksize", "_dtype_backend",
+                 "_dtype", "_parse_dates", "_date_format", "_use_sidecar")
+    def __init__(self, source_url, data_file_path, download_path="./data/",
+                 already_downloaded=True, to_be_copied=False, engine="pandas",
+                 chunksize=None, dtype_backend="numpy_nullable",
+                 dtype=None, parse_dates=None, date_format=None,
+                 use_sidecar=True, dtype_policy=None):
         """
         Constructor that is specific to csv files.  Has simple methods that would be useful for
         other subclasses to implement or use
-        
+
         Parameters
         ----------
         :param source_url: str
-           The source URL or link where the dataset needs to be 
-        downloaded from or is present. The dataset will be copied onto the ./data 
+           The source URL or link where the dataset needs to be
+        downloaded from or is present. The dataset will be copied onto the ./data
         :param data_file_path: str
             The path of the extracted (if inside an archive). If unarchived
         provide just the name of the file along with the source_url/folder name
-            
+
         :param download_path: str
-           the local folder or url where the dataset needs to be 
+           the local folder or url where the dataset needs to be
         downloaded and extracted
-        
-        already_downloaded
+
+        :param already_downloaded: bool
+            Indicates that the dataset is already downloaded in the
+        download_path and only needs loading
         :param to_be_copied: bool
             True: needs copying from source_url to download path
             False: it does not need copying
+        :param engine: str
+            one of "pandas", "pyarrow" or "polars". Selects the parser used
+        by load().  "pandas" is the compatible default; "pyarrow" and "polars"
+        parse with multiple threads which is several times faster on large
+        files.  Falls back to pandas if the selected engine is not installed
+        :param chunksize: int
+            if set, load() reads the csv in chunks of this many rows and
+        concatenates them.  Bounds the peak working set to roughly one chunk
+        so datasets close to the RAM size do not OOM while parsing.  Only
+        honoured by the pandas engine
+        :param dtype_backend: str
+            pandas dtype backend used for the chunked read, defaults to
+        "numpy_nullable"
+        :param dtype: dict
+            optional column name to dtype mapping passed through to the
+        parser.  Supplying it skips the dtype inference scan over the whole
+        file.  When omitted the dtypes inferred on the first load are
+        pickled next to the csv and reused on later loads
+        :param parse_dates: list
+            column names the parser should treat as dates
+        :param date_format: str
+            strftime format for parse_dates so pandas can use the fast
+        vectorized date parser instead of guessing per value
+        :param use_sidecar: bool
+            write a columnar Parquet copy next to the csv on the first
+        load and prefer it on later loads.  Reloading Parquet skips csv
+        tokenization entirely which is an order of magnitude faster.
+        Needs pyarrow; silently stays on the csv path without it
+        :param dtype_policy: callable
+            post-parse narrowing/quantization hook, see InMemDataset.
+        None (the default) keeps the parsed dtypes untouched
         """
-        if !_needs_extraction(self._source_url):
+        super().__init__(
+            source_url=source_url,
+            download_path=download_path,
+            train_data_filename=data_file_path,
+            # a csv is one flat file; without these the download lands
+            # in download_path/train/ while load() reads download_path
+            train_subfolder="", validate_subfolder="", test_subfolder="",
+            validate_data_present=False, test_data_present=False,
+            already_downloaded=already_downloaded,
+            dtype_policy=dtype_policy
+            )
+        self._to_be_copied = to_be_copied
+        self._engine = engine
+        self._chunksize = chunksize
+        self._dtype_backend = dtype_backend
+        self._dtype = dtype
+        self._parse_dates = parse_dates
+        self._date_format = date_format
+        self._use_sidecar = use_sidecar
+        if not self._needs_extraction(self._source_url):
             self._extracted = True
 
     def load(self):
         """
-        Loads the dataset into the memory
+        Loads the dataset into the memory with the engine selected in the
+        constructor.  Whichever engine parsed the file the result is kept
+        as a pandas DataFrame in the _dataset member
         """
-        data_url = ""
-        if ! self.already_downloaded:
-            """ Download extract and save to the download path NOT TESTED ///???"""
-            if _isweburl(source_url)
-                self.download()
-                
+        import pandas as pd
+        if not self._downloaded:
+            # web sources are always fetched; local ones only when the
+            # caller asked for a copy, which _download satisfies with
+            # the kernel-side sendfile path
+            if self._is_web_url(self._source_url) or self._to_be_copied:
+                self.download_extract_if_needed()
+
+        data_url = os.path.join(self._download_url,
+                                self._train_data_filename)
+        if self._use_sidecar:
+            sidecar = self._load_sidecar(data_url)
+            if sidecar is not None:
+                self._dataset = sidecar
+                return
+        if self._chunksize is not None:
+            parts = [self._process_chunk(chunk)
+                     for chunk in self.iter_chunks()]
+            self._dataset = pd.concat(parts, ignore_index=True, copy=False)
         else:
-            data_url = os.path.join(self.download_url,
-                                    self._train_data_filename)
-        self._dataset = pd.read_csv(data_url)
-        
-    def save(path):
+            self._dataset = self._read_csv(data_url)
+        self._dataset = self._apply_dtype_policy(self._dataset)
+        if self._use_sidecar:
+            self._save_sidecar(data_url, self._dataset)
+
+    def load_numeric(self, dtype=None):
+        """
+        Parses a purely numeric csv straight into a 2-d ndarray with a
+        numba kernel, bypassing pandas' per-column dispatch entirely.
+        Rows are split on newlines found with one vectorized scan and
+        parsed in parallel across cores.  Falls back to the regular
+        pandas path (returning its to_numpy view) when numba is missing
+        or a header sniff finds non-numeric columns
+
+        :param dtype: numpy dtype
+            element type of the returned array, np.float32 when omitted
+        :return: numpy.ndarray of shape (n_rows, n_cols)
         """
+        import numpy as np
+        if dtype is None:
+            dtype = np.float32
+        data_url = os.path.join(self._download_url,
+                                self._train_data_filename)
+        global _parse_rows_kernel
+        if _parse_rows_kernel is None:
+            try:
+                _parse_rows_kernel = _build_parse_rows_kernel()
+            except ImportError:
+                logging.warning("numba not installed, load_numeric falling "
+                                "back to pandas")
+                self._dataset = self._read_csv(data_url)
+                return self._dataset.to_numpy(dtype=dtype)
+
+        buf = np.fromfile(data_url, dtype=np.uint8)
+        if buf.size == 0:
+            self._dataset = np.empty((0, 0), dtype=dtype)
+            return self._dataset
+        newlines = np.flatnonzero(buf == ord("\n"))
+        if len(newlines) == 0 or newlines[-1] != len(buf) - 1:
+            # no trailing newline, treat EOF as one
+            newlines = np.append(newlines, len(buf))
+        row_starts = np.concatenate(([0], newlines[:-1] + 1))
+        row_ends = newlines.copy()
+        # trim \r of crlf files
+        row_ends[buf[np.minimum(row_ends - 1, len(buf) - 1)] == ord("\r")] -= 1
+
+        first_line = bytes(buf[row_starts[0]:row_ends[0]])
+        numeric_bytes = set(b"0123456789+-.eE, \t")
+        if not set(first_line) <= numeric_bytes:
+            # header row: drop it and sniff the first data row
+            row_starts, row_ends = row_starts[1:], row_ends[1:]
+            if len(row_starts) and not set(
+                    bytes(buf[row_starts[0]:row_ends[0]])) <= numeric_bytes:
+                self._dataset = self._read_csv(data_url)
+                return self._dataset.to_numpy(dtype=dtype)
+
+        # drop empty trailing rows
+        keep = row_ends > row_starts
+        row_starts, row_ends = row_starts[keep], row_ends[keep]
+        if len(row_starts) == 0:
+            # nothing but blank lines (or a lone header) survived the
+            # filter; same shape as the empty-file case above
+            self._dataset = np.empty((0, 0), dtype=dtype)
+            return self._dataset
+        n_cols = bytes(buf[row_starts[0]:row_ends[0]]).count(b",") + 1
+        out = np.empty((len(row_starts), n_cols), dtype=dtype)
+        _parse_rows_kernel(buf, row_starts, row_ends, out)
+        self._dataset = out
+        return out
+
+    @staticmethod
+    def specialize(schema):
+        """
+        Generates a loader function with the schema burnt in, for
+        recurring datasets that share column layout (same schema, new
+        file every day).  The generated source closes over the dtype
+        dict so each call skips kwarg construction and read_csv's
+        keyword validation, and the C parser is planned with a fixed
+        schema.  Loaders are cached per schema for the life of the
+        process
+
+        :param schema: dict
+            column name to dtype mapping for read_csv; values may be
+        dtype strings, numpy dtypes or type objects, anything read_csv
+        accepts
+        :return: callable taking a csv path and returning a DataFrame
+        """
+        key = frozenset((name, str(dt)) for name, dt in schema.items())
+        loader = _specialized_loaders.get(key)
+        if loader is None:
+            import pandas as pd
+            # the schema is closed over rather than repr'd into the
+            # source: reprs of numpy dtypes and type objects are not
+            # valid Python, so only plain-string schemas survived the
+            # old formatting
+            namespace = {"pd": pd, "_schema": dict(schema)}
+            source = ("def _load(path):\n"
+                      "    return pd.read_csv(path, dtype=_schema, "
+                      "engine='c', low_memory=False)\n")
+            exec(compile(source, "<oonn.datasets.csv.specialize>", "exec"),
+                 namespace)
+            loader = namespace["_load"]
+            _specialized_loaders[key] = loader
+        return loader
+
+    def _sidecar_path(self, data_url):
+        return data_url + ".parquet"
 
+    def _load_sidecar(self, data_url):
+        """
+        Returns the frame stored in the Parquet sidecar of a previous
+        load, or None when the sidecar is missing, stale or pyarrow is
+        not installed
+
+        :param data_url: str
+            path of the csv file being loaded
+        :return: pandas.DataFrame or None
+        """
+        sidecar_path = self._sidecar_path(data_url)
+        if not os.path.exists(sidecar_path):
+            return None
+        if os.path.getmtime(sidecar_path) < os.path.getmtime(data_url):
+            return None
+        try:
+            import pandas as pd
+            return pd.read_parquet(sidecar_path, engine="pyarrow")
+        except ImportError:
+            return None
+        except Exception as err:
+            # a truncated or corrupt sidecar is just a miss; the csv
+            # parse below will rebuild it
+            logging.warning("unreadable parquet sidecar %s: %s",
+                            sidecar_path, err)
+            return None
+
+    def _save_sidecar(self, data_url, dataset):
+        """
+        Writes the freshly parsed frame as a compressed Parquet sidecar
+        next to the csv so later loads skip tokenization
+
+        :param data_url: str
+            path of the csv file that was loaded
+        :param dataset: pandas.DataFrame
+            the parsed frame to persist
+        """
+        # temp file + rename, same pattern as the extract markers: a
+        # crash mid-write must not leave a truncated sidecar that is
+        # newer than the csv and poisons every later load
+        sidecar_path = self._sidecar_path(data_url)
+        tmp_path = sidecar_path + ".tmp"
+        try:
+            dataset.to_parquet(tmp_path, engine="pyarrow",
+                               compression="zstd")
+            os.replace(tmp_path, sidecar_path)
+        except Exception as err:
+            # broad on purpose, mirroring the read side: pyarrow raises
+            # ArrowInvalid/ArrowTypeError for frames it cannot convert
+            # (mixed-type object columns from messy csvs) and a failed
+            # optimization must not crash the load that just succeeded
+            logging.warning("could not write parquet sidecar: %s", err)
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+    def iter_chunks(self):
+        """
+        Generator that yields the dataset chunksize rows at a time without
+        ever holding the full frame in memory.  Downstream code that can
+        train incrementally should prefer this over load()
+
+        :return: generator of pandas.DataFrame
+        """
+        import pandas as pd
+        data_url = os.path.join(self._download_url,
+                                self._train_data_filename)
+        chunksize = self._chunksize if self._chunksize is not None else 1 << 16
+        reader = pd.read_csv(data_url, chunksize=chunksize,
+                             dtype_backend=self._dtype_backend)
+        for chunk in reader:
+            yield chunk
+
+    def _process_chunk(self, chunk):
+        """
+        Hook called on every chunk during a chunked load().  The base
+        implementation narrows the dtypes so the concatenated frame is
+        smaller than a whole-file parse would produce.  Subclasses can
+        override to filter or transform rows before they are collected
+
+        :param chunk: pandas.DataFrame
+        :return: pandas.DataFrame
+        """
+        return chunk.convert_dtypes()
+
+    def _read_csv(self, data_url):
+        """
+        Dispatches the csv parse to the engine selected in the constructor
+        and returns a pandas DataFrame
+
+        :param data_url: str
+            path of the csv file that needs to be parsed
+        :return: pandas.DataFrame
+        """
+        import pandas as pd
+        if self._engine == "pyarrow":
+            try:
+                import pyarrow.csv as pacsv
+                table = pacsv.read_csv(
+                    data_url,
+                    read_options=pacsv.ReadOptions(use_threads=True,
+                                                   block_size=16 << 20))
+                return table.to_pandas(self_destruct=True)
+            except ImportError:
+                logging.warning("pyarrow not installed, falling back to pandas")
+        elif self._engine == "polars":
+            try:
+                import polars as pl
+                return pl.read_csv(data_url,
+                                   n_threads=os.cpu_count()).to_pandas()
+            except ImportError:
+                logging.warning("polars not installed, falling back to pandas")
+        dtype = self._dtype
+        if dtype is None:
+            dtype = self._load_schema_cache(data_url)
+        dataset = pd.read_csv(data_url, dtype=dtype,
+                              parse_dates=self._parse_dates,
+                              date_format=self._date_format,
+                              engine="c", low_memory=False)
+        if dtype is None:
+            self._save_schema_cache(data_url, dataset)
+        return dataset
+
+    def _schema_cache_path(self, data_url):
+        return data_url + ".dtypes.pkl"
+
+    def _load_schema_cache(self, data_url):
+        """
+        Returns the column dtypes pickled by an earlier load of the same
+        csv, or None when there is no cache yet.  Passing the cached dtypes
+        back to read_csv skips the whole-file type inference scan
+
+        :param data_url: str
+            path of the csv file being loaded
+        :return: dict or None
+        """
+        cache_path = self._schema_cache_path(data_url)
+        if not os.path.exists(cache_path):
+            return None
+        if os.path.getmtime(cache_path) < os.path.getmtime(data_url):
+            return None
+        import pickle
+        try:
+            with open(cache_path, "rb") as cache_file:
+                return pickle.load(cache_file)
+        except Exception:
+            # a corrupt cache is just a miss; inference rebuilds it
+            return None
+
+    def _save_schema_cache(self, data_url, dataset):
+        """
+        Pickles the inferred column dtypes next to the csv so the next
+        load can skip inference
+
+        :param data_url: str
+            path of the csv file that was loaded
+        :param dataset: pandas.DataFrame
+            the freshly parsed frame whose dtypes are cached
+        """
+        import pickle
+        # temp file + rename so a crash mid-dump cannot leave a corrupt
+        # cache with a fresh mtime
+        cache_path = self._schema_cache_path(data_url)
+        tmp_path = cache_path + ".tmp"
+        try:
+            with open(tmp_path, "wb") as cache_file:
+                pickle.dump({name: str(dt) for name, dt in
+                             dataset.dtypes.items() if dt.kind != "M"},
+                            cache_file)
+            os.replace(tmp_path, cache_path)
+        except OSError as err:
+            logging.warning("could not write dtype cache: %s", err)
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+
+    def save(self, path):
+        """
+        Saves the in memory dataset as a csv file in the given path
         """
+        if self._dataset is not None:
+            self._dataset.to_csv(path)
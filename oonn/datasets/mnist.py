@@ -1,10 +1,103 @@
+# -*- coding: utf-8 -*-
+
+"""
+@author: Shankar Ratneshwaran
+@classes:MNISTDataset
+@filename:mnist.py
+@description: Dataset download and manipulation class for the MNIST
+handwritten digit data. The idx files are decompressed once to disk and
+then memory mapped, so only the pages actually touched are resident
+"""
+
 from ..prep.data import InMemDataset
+import numpy as np
+import gzip
+import os
+import shutil
+import struct
+
 class MNISTDataset(InMemDataset):
-    def __init__(source_url = "https://storage.googleapis.com/cvdf-datasets/mnist/",
-                  download_path= "./data/MNIST", ):
+    """
+    MNISTDataset downloads the four idx ubyte archives and presents them
+    as numpy memmaps. The memmap keeps RSS at O(1): the OS pages data in
+    as training iterators touch it, overlapping I/O with compute, and
+    nothing is copied unless a writable array is asked for
+    """
+    __slots__ = ()
+
+    def __init__(self,
+                 source_url="https://storage.googleapis.com/cvdf-datasets/mnist/",
+                 download_path="./data/MNIST",
+                 already_downloaded=False):
+        """
+        Constructor that initializes all the internal variables to the
+        standard MNIST file layout
+
+        Parameters
+        ----------
+        :param source_url: str
+            base url the four idx .gz files are fetched from
+        :param download_path: str
+            local folder the files are downloaded and decompressed into
+        :param already_downloaded: bool
+            set when the files are already in download_path
+        """
         super().__init__(
-            source_url = source_url,
-            )
+            source_url=source_url,
+            download_path=download_path,
+            train_data_filename="train-images-idx3-ubyte.gz",
+            train_labels_filename="train-labels-idx1-ubyte.gz",
+            test_data_filename="t10k-images-idx3-ubyte.gz",
+            test_labels_filename="t10k-labels-idx1-ubyte.gz",
+            train_subfolder="", validate_subfolder="", test_subfolder="",
+            validate_data_present=False,
+            already_downloaded=already_downloaded)
+
+    def load(self):
+        """
+        Loads the dataset as read-only memmaps keyed by part name in the
+        _dataset member: train_images, train_labels, test_images,
+        test_labels
+        """
+        self.download_extract_if_needed()
+        self._dataset = {
+            "train_images": self._load_idx(self._train_data_filename),
+            "train_labels": self._load_idx(self._train_labels),
+            "test_images": self._load_idx(self._test_data_filename),
+            "test_labels": self._load_idx(self._test_labels),
+            }
+
+    def as_ndarray(self, part):
+        """
+        Returns a writable in-memory copy of one part for callers that
+        need to mutate the data; everyone else should use the memmaps in
+        _dataset directly
+
+        :param part: str
+            one of the _dataset keys
+        :return: numpy.ndarray
+        """
+        return np.array(self._dataset[part])
+
+    def _load_idx(self, gz_filename):
         """
-        Constructor that initializes all the internal variables some default
+        Memory maps one idx ubyte file, decompressing the .gz next to it
+        first if extraction has not produced the sidecar yet.  The idx
+        header (magic + big-endian dimension sizes) gives the shape and
+        the memmap starts right after it
+
+        :param gz_filename: str
+            name of the downloaded .gz file
+        :return: numpy.memmap of uint8
         """
+        gz_path = os.path.join(self._download_url, gz_filename)
+        bin_path = gz_path[:-3]
+        if not os.path.exists(bin_path):
+            with gzip.open(gz_path, "rb") as src, open(bin_path, "wb") as dst:
+                shutil.copyfileobj(src, dst, length=1 << 20)
+        with open(bin_path, "rb") as idx_file:
+            magic = idx_file.read(4)
+            ndim = magic[3]
+            dims = struct.unpack(">" + "I" * ndim, idx_file.read(4 * ndim))
+        return np.memmap(bin_path, dtype=np.uint8, mode="r",
+                         offset=4 + 4 * ndim, shape=dims)
@@ -11,22 +11,212 @@ The Dataset class could be used directly for some basic datasets but it is
 highly recommended that the class is extended for use
 """
 
+import functools
+import hashlib
 import logging
-import urllib.request
-import tarfile
-import zipfile
-import shutil
 import os
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import urllib3
+except ImportError:
+    urllib3 = None
+
+try:
+    import rapidgzip
+except ImportError:
+    rapidgzip = None
+
+
+def DTYPE_FP32(df):
+    """
+    Default dtype policy for InMemDataset: narrows float64 columns to
+    float32 and int64 columns to the smallest integer type that holds
+    their values, halving (or better) the bytes the frame moves through
+    the memory hierarchy
+
+    :param df: pandas.DataFrame
+    :return: pandas.DataFrame
+    """
+    import pandas as pd
+    float_cols = df.select_dtypes("float64").columns
+    if len(float_cols):
+        df[float_cols] = df[float_cols].astype("float32")
+    for col in df.select_dtypes("int64").columns:
+        df[col] = pd.to_numeric(df[col], downcast="integer")
+    return df
+
+
+def DTYPE_FP16(df):
+    """
+    Opt-in dtype policy that narrows every float column to float16.
+    Quarter the footprint of float64 at the cost of ~3 decimal digits;
+    fine for data that feeds straight into low precision training
+
+    :param df: pandas.DataFrame
+    :return: pandas.DataFrame
+    """
+    df = DTYPE_FP32(df)
+    float_cols = df.select_dtypes("float").columns
+    if len(float_cols):
+        df[float_cols] = df[float_cols].astype("float16")
+    return df
+
+
+def DTYPE_INT8_QUANT(df):
+    """
+    Opt-in dtype policy that quantizes every float column to int8 with
+    per-column min-max affine scaling. The scale and zero point of each
+    column are kept in df.attrs["quant_scale"]/["quant_zero_point"] so
+    consumers can dequantize
+
+    :param df: pandas.DataFrame
+    :return: pandas.DataFrame
+    """
+    import numpy as np
+    df = DTYPE_FP32(df)
+    scales = {}
+    zero_points = {}
+    for col in df.select_dtypes("float").columns:
+        lo = float(df[col].min())
+        hi = float(df[col].max())
+        scale = (hi - lo) / 255.0
+        if scale == 0.0:
+            scale = 1.0
+        df[col] = np.round((df[col] - lo) / scale - 128.0).astype("int8")
+        scales[col] = scale
+        zero_points[col] = lo
+    df.attrs["quant_scale"] = scales
+    df.attrs["quant_zero_point"] = zero_points
+    return df
+
+
+class _TeeReader(object):
+    """
+    Minimal read-only file object that copies everything read from the
+    wrapped response into a local file on the way past.  Lets a streaming
+    tarfile consume an HTTP response while the archive is still written
+    to disk for the download/extract bookkeeping
+    """
+    __slots__ = ("_response", "_out_file", "_progress", "_bytes_read")
+
+    def __init__(self, response, out_file, progress=None):
+        self._response = response
+        self._out_file = out_file
+        self._progress = progress
+        self._bytes_read = 0
+
+    def read(self, size=-1):
+        data = self._response.read(size)
+        if data:
+            self._out_file.write(data)
+            self._bytes_read += len(data)
+            if self._progress is not None:
+                self._progress(self._bytes_read)
+        return data
+
+    def drain(self):
+        """ consume whatever the tar reader did not ask for (trailing
+        padding) so the on-disk archive is byte-complete """
+        while self.read(1 << 20):
+            pass
+
+
+class _SeekableMmap(object):
+    """
+    Adapts an mmap to the seekable file interface zipfile expects (mmap
+    itself has read/seek/tell but not seekable/readable)
+    """
+    __slots__ = ("_mapped",)
+
+    def __init__(self, mapped):
+        self._mapped = mapped
+
+    def read(self, size=-1):
+        return self._mapped.read(size)
+
+    def seek(self, pos, whence=0):
+        self._mapped.seek(pos, whence)
+        return self._mapped.tell()
+
+    def tell(self):
+        return self._mapped.tell()
+
+    def seekable(self):
+        return True
+
+    def readable(self):
+        return True
+
+
+@functools.lru_cache(maxsize=32)
+def _listdir_set(folder):
+    """
+    Returns the names inside folder as a frozenset, cached so repeated
+    existence checks over the same folder cost one getdents instead of a
+    stat per file.  Missing folders yield an empty set.  Callers that
+    change the folder must invalidate with _listdir_set.cache_clear()
+
+    :param folder: str
+        folder whose listing is wanted
+    :return: frozenset of str
+    """
+    try:
+        return frozenset(os.listdir(folder))
+    except FileNotFoundError:
+        return frozenset()
 
 # from  ..utils.execution import Process, Task
 class Dataset(object):
     """
-    Base class for all Datasets that need to be downloaded and unzipped.  
+    Base class for all Datasets that need to be downloaded and unzipped.
+    Archive extraction assumes Python >= 3.8; on older interpreters the
+    streaming tar path avoids the slow buffered-seek reader but is not
+    otherwise supported.
     """
 
+    __slots__ = ("_source_url", "_download_url",
+                 "_train_data_filename", "_validate_data_filename",
+                 "_test_data_filename",
+                 "_train_labels", "_validate_labels", "_test_labels",
+                 "_train_subfolder", "_validate_subfolder", "_test_subfolder",
+                 "_train_data_present", "_validate_data_present",
+                 "_test_data_present",
+                 "_extract_needed", "_refresh_everytime_used",
+                 "_downloaded", "_extracted", "_last_progress_ts")
+
     extract_marker = "_extracted"
 
+    """ suffix of the .<filename>_size marker recording the expected
+    byte count of a download so a file cut short by a killed process
+    fails the downloaded check and reaches the Range-resume path """
+    size_marker = "_size"
+
+    """ Connection pool shared by every Dataset instance so the three
+    train/validate/test downloads reuse one TCP+TLS connection per host
+    instead of paying a fresh handshake per file.  Created lazily on the
+    class by _get_pool() the first time a download happens """
+    _pool = None
+
+    @classmethod
+    def _get_pool(cls):
+        """
+        Returns the shared urllib3 connection pool, creating it on first
+        use.  Returns None when urllib3 is not installed and downloads
+        fall back to urllib.request
+
+        :return: urllib3.PoolManager or None
+        """
+        if urllib3 is None:
+            return None
+        if Dataset._pool is None:
+            Dataset._pool = urllib3.PoolManager(
+                num_pools=4, maxsize=16,
+                retries=urllib3.util.Retry(total=5, backoff_factor=0.3))
+        return Dataset._pool
+
     def __init__(self, source_url, download_url="./data/",
                  train_data_filename="", validate_data_filename="", test_data_filename="",
                  train_labels_filename="", validate_labels_filename="", test_labels_filename="",
@@ -130,32 +320,59 @@ class Dataset(object):
         self._train_data_present = train_data_present
         self._validate_data_present = validate_data_present
         self._test_data_present = test_data_present
-        self._extract = extract
+        # stored under a different name so the flag does not shadow the
+        # _extract() method on the instance
+        self._extract_needed = extract
         self._refresh_everytime_used = refresh_everytime_used
         self._downloaded = already_downloaded
         self._extracted = False
+        self._last_progress_ts = 0.0
 
-    def _print_download_progress(self, count, block_size, total_size):
+    def _make_progress_hook(self, total_size):
         """
-        Function used as a callback in download_extract_if_needed
-        Parameters
-        ----------       
-        count: 
-        block_size:
-        total_size:
-        """
-        # Percentage completion.
-        pct_complete = float(count * block_size) / total_size
-
-        # Limit it because rounding errors may cause it to exceed 100%.
-        pct_complete = min(1.0, pct_complete)
+        Binds a progress callback specialized for whether the response
+        size is known.  Chunked responses have no Content-Length, which
+        used to feed total_size = -1 into the percentage division and
+        print negative progress; the known/unknown decision is now made
+        once here instead of on every block, and the unknown-size hook
+        reports plain byte counts.  Returns None when stdout is not a
+        tty, since a \r progress line is useless in redirected output
 
-        # Status-message. Note the \r which means the line should overwrite itself.
-        msg = "\r- Progress: {0:.1%}".format(pct_complete)
+        :param total_size: int
+            Content-Length of the response, or -1 when unknown
+        :return: callable(count, block_size) or None
+        """
+        if not sys.stdout.isatty():
+            return None
+        self._last_progress_ts = 0.0
+        if total_size > 0:
+            scale = 1.0 / total_size
+            def hook(count, block_size):
+                # The hook fires once per block; doing the write syscall
+                # every time slows the download itself.  Only refresh
+                # the line every 50 ms, except for the final update
+                done = count * block_size * scale
+                now = time.monotonic()
+                if now - self._last_progress_ts < 0.05 and done < 1.0:
+                    return
+                self._last_progress_ts = now
+                # min() because rounding may push the last block past 100%
+                sys.stdout.write(f"\r- Progress: {min(1.0, done):.1%}")
+                # a \r line never ends, so line-buffered stdout would
+                # hold it until the final newline; the throttle already
+                # caps this at 20 flushes/s
+                sys.stdout.flush()
+            return hook
 
-        # Print it.
-        sys.stdout.write(msg)
-        sys.stdout.flush()
+        def hook(count, block_size):
+            now = time.monotonic()
+            if now - self._last_progress_ts < 0.05:
+                return
+            self._last_progress_ts = now
+            sys.stdout.write(
+                f"\r- Progress: {count * block_size / (1 << 20):.1f} MiB")
+            sys.stdout.flush()
+        return hook
 
     def _check_if_downloaded(self, source_url, download_folder, subfolder, filename):
         """
@@ -173,10 +390,24 @@ class Dataset(object):
             True: Already downloaded
             False: Not downloaded
         """
-        retval = False
-        if os.path.exists(os.path.join(download_folder,[subfolder,filename])):
-            retval = True
-        return retval
+        folder = os.path.join(download_folder, subfolder)
+        if filename == "" or filename not in _listdir_set(folder):
+            return False
+        # the size marker written at download start records how many
+        # bytes the transfer should have produced; a shorter file is a
+        # partial left by a killed run and must count as not downloaded
+        # so _download gets the chance to resume it
+        try:
+            expected = int(open(os.path.join(
+                folder, "." + filename + self.size_marker)).read())
+        except (OSError, ValueError):
+            # no marker (local copies, unknown Content-Length) or a
+            # corrupt one: presence is the best signal available
+            return True
+        try:
+            return os.path.getsize(os.path.join(folder, filename)) >= expected
+        except OSError:
+            return False
     def _needs_extraction(self, url):
         """
         Checks for extentions in the url to see if it needs extraction
@@ -191,8 +422,11 @@ class Dataset(object):
 
     def check_if_extracted(self, source_url, download_folder, filename):
         """
-        Base class implementation always returns True if there is an .<filename>_extracted file in the folder
-        Subclasses can do something smarter
+        Base class implementation checks the .<filename>_extracted marker
+        written by _extract, which records the archive's size and sha256.
+        The extract is only trusted when the archive still matches the
+        marker, so a replaced archive is re-extracted and an unchanged one
+        never is.  Subclasses can do something smarter
         :param source_url:str
             Source URL to download from
         :param download_folder: str
@@ -204,7 +438,43 @@ class Dataset(object):
             False: if not already extracted
 
         """
-        return os.path.exists(os.path.join(download_folder,"."+filename+self.extract_marker))
+        marker_filename = os.path.join(download_folder,
+                                       "."+filename+self.extract_marker)
+        archive_path = os.path.join(download_folder, filename)
+        if not os.path.exists(marker_filename):
+            return False
+        try:
+            recorded = open(marker_filename).read().split()
+            if len(recorded) != 2:
+                # legacy empty marker, keep trusting it
+                return True
+            recorded_size, recorded_digest = recorded
+            if int(recorded_size) != os.path.getsize(archive_path):
+                return False
+            # size matches; only pay for a rehash when the archive was
+            # touched after the marker was written
+            if os.path.getmtime(archive_path) > os.path.getmtime(marker_filename):
+                return recorded_digest == self._archive_digest(archive_path)
+            return True
+        except (OSError, ValueError):
+            return False
+
+    def _archive_digest(self, archive_path):
+        """
+        Returns the sha256 hex digest of the archive, streamed so large
+        files never sit in memory
+
+        :param archive_path: str
+            path of the archive to hash
+        :return: str
+        """
+        with open(archive_path, "rb") as archive_file:
+            if hasattr(hashlib, "file_digest"):
+                return hashlib.file_digest(archive_file, "sha256").hexdigest()
+            digest = hashlib.sha256()
+            for block in iter(lambda: archive_file.read(1 << 20), b""):
+                digest.update(block)
+            return digest.hexdigest()
 
     def _download(self, source_url, download_folder, filename, verbose=True):
         """
@@ -221,9 +491,9 @@ class Dataset(object):
         logging.info("Dataset: Downloading "+filename+" from "+source_url+" to "+download_folder)
         dwnld_path = os.path.join(download_folder, filename)
 
-        # Check if the download directory exists, otherwise create it.
-        if not os.path.exists(download_folder):
-            os.makedirs(download_folder)
+        # Create the download directory if needed. exist_ok avoids the
+        # race when several download threads share a folder
+        os.makedirs(download_folder, exist_ok=True)
         if verbose:
             print("Downloading", filename, end=" ")
 
@@ -234,22 +504,233 @@ class Dataset(object):
             url_req = os.path.join(source_url, filename)
         else:
             url_req = source_url
-        if verbose:
-            file_path, _ = urllib.request.urlretrieve(url=url_req,
-                                                      filename=dwnld_path,
-                                                      reporthook=self._print_download_progress)
-        else:
+
+        # deferred like tarfile/zipfile in _extract: importing the
+        # urllib machinery costs a few ms that cache-hit runs never need
+        import urllib.parse
+
+        parsed = urllib.parse.urlparse(url_req)
+        if parsed.scheme in ("", "file"):
+            # Local source: copy inside the kernel instead of looping
+            # bytes through userspace buffers
+            src_path = parsed.path if parsed.scheme == "file" else url_req
+            self._local_copy(src_path, dwnld_path)
+            # the folder contents changed, drop the cached listings
+            _listdir_set.cache_clear()
             if verbose:
-                file_path, _ = urllib.request.urlretrieve(url=url_req,
-                                                          filename=dwnld_path)
+                print("Done!")
+            return
+
+        pool = self._get_pool()
+        if pool is not None:
+            self._download_pooled(pool, url_req, dwnld_path, verbose)
+        else:
+            self._download_urlopen(url_req, dwnld_path, verbose)
+        # the folder contents changed, drop the cached listings
+        _listdir_set.cache_clear()
         if verbose:
             print("Done!")
 
+    def _local_copy(self, src_path, dst_path):
+        """
+        Copies a local file with os.sendfile where available so the bytes
+        move kernel to kernel without Python-side buffer allocations.
+        Falls back to a buffered userspace copy on platforms without
+        sendfile-to-regular-file support
+
+        :param src_path: str
+            path of the source file
+        :param dst_path: str
+            path the file is copied to
+        """
+        with open(src_path, "rb") as src, open(dst_path, "wb") as dst:
+            if hasattr(os, "sendfile"):
+                size = os.fstat(src.fileno()).st_size
+                offset = 0
+                while offset < size:
+                    try:
+                        sent = os.sendfile(dst.fileno(), src.fileno(),
+                                           offset, size - offset)
+                    except OSError:
+                        # BSD/macOS expose os.sendfile but only accept a
+                        # socket out-fd; finish with a userspace copy
+                        # from wherever sendfile stopped
+                        src.seek(offset)
+                        import shutil
+                        shutil.copyfileobj(src, dst, length=1 << 20)
+                        return
+                    if sent == 0:
+                        break
+                    offset += sent
+            else:
+                import shutil
+                shutil.copyfileobj(src, dst, length=1 << 20)
+
+    def _download_urlopen(self, url_req, dwnld_path, verbose=True):
+        """
+        Fallback download when urllib3 is not installed.  urlretrieve
+        allocated a fresh bytes object per block; here the response is
+        read into one reused 1 MiB bytearray through a memoryview, so
+        the transfer makes no per-block allocations at all
+
+        :param url_req: str
+            full url of the file to download
+        :param dwnld_path: str
+            local path the file is written to
+        :param verbose: bool
+            Displays the progress bar
+        """
+        import urllib.request
+        response = urllib.request.urlopen(url_req)
+        total_size = int(response.headers.get("Content-Length", -1))
+        buffer = bytearray(1 << 20)
+        view = memoryview(buffer)
+        block_size = len(buffer)
+        count = 0
+        self._write_size_marker(dwnld_path, total_size)
+        progress = self._make_progress_hook(total_size) if verbose else None
+        with response, open(dwnld_path, "wb", buffering=0) as out_file:
+            self._preallocate(out_file, total_size)
+            while True:
+                read = response.readinto(buffer)
+                if not read:
+                    break
+                out_file.write(view[:read])
+                count += 1
+                if progress is not None:
+                    progress(count, block_size)
+
+    def _download_pooled(self, pool, url_req, dwnld_path, verbose=True):
+        """
+        Streams url_req into dwnld_path through the shared connection pool
+        in 1 MiB chunks so the whole file never sits in memory and the
+        connection is kept alive for the next download
+
+        :param pool: urllib3.PoolManager
+            the shared pool returned by _get_pool()
+        :param url_req: str
+            full url of the file to download
+        :param dwnld_path: str
+            local path the file is written to
+        :param verbose: bool
+            Displays the progress bar
+        """
+        # a partial file left by an interrupted run is resumed with a
+        # Range request instead of being re-fetched from byte zero
+        existing = 0
+        if os.path.exists(dwnld_path):
+            existing = os.path.getsize(dwnld_path)
+        headers = {"Range": "bytes=%d-" % existing} if existing > 0 else None
+        response = pool.request("GET", url_req, headers=headers,
+                                preload_content=False)
+        total_size = int(response.headers.get("Content-Length", -1))
+        if response.status == 206:
+            # Content-Length of a 206 covers only the remainder.
+            # r+b (not ab) because append mode writes at whatever EOF
+            # the preallocation below moved it to; here we seek to the
+            # resume point explicitly
+            mode = "r+b"
+            if total_size > 0:
+                total_size += existing
+        elif response.status == 416 and existing > 0:
+            # Range not satisfiable: the file on disk already covers
+            # the full body, nothing left to fetch; refresh the size
+            # marker so the downloaded check stops flagging it
+            response.release_conn()
+            self._write_size_marker(dwnld_path, existing)
+            return
+        elif response.status >= 400:
+            # urllib3 does not raise on HTTP errors the way urlretrieve
+            # did; without this check the 404 page would be saved as
+            # the dataset and pass the presence check on every later run
+            response.release_conn()
+            raise RuntimeError("HTTP %d fetching %s"
+                               % (response.status, url_req))
+        else:
+            # server ignored the Range (or there was none): full body,
+            # truncate whatever partial bytes were there
+            mode = "wb"
+            existing = 0
+        block_size = 1 << 20
+        count = existing // block_size
+        # written before the first byte so a killed transfer leaves the
+        # evidence needed to resume it on the next run
+        self._write_size_marker(dwnld_path, total_size)
+        progress = self._make_progress_hook(total_size) if verbose else None
+        try:
+            # buffering=0 gives a raw FileIO: each 1 MiB chunk goes to
+            # the kernel in a single write() with no buffered-layer
+            # bookkeeping between
+            with open(dwnld_path, mode, buffering=0) as out_file:
+                self._preallocate(out_file, total_size)
+                if existing:
+                    out_file.seek(existing)
+                for chunk in response.stream(block_size):
+                    out_file.write(chunk)
+                    count += 1
+                    if progress is not None:
+                        progress(count, block_size)
+        except Exception:
+            # a half-written body must not pass the presence check as a
+            # finished download on the next run
+            try:
+                os.unlink(dwnld_path)
+            except OSError:
+                pass
+            raise
+        finally:
+            response.release_conn()
+
+    @staticmethod
+    def _preallocate(out_file, length):
+        """
+        Reserves length bytes for out_file up front with posix_fallocate
+        when the platform has it, so a streamed download grows the file
+        in one extent instead of one allocation per chunk and ENOSPC
+        surfaces before the transfer starts
+
+        :param out_file: file object
+            open writable file backed by a real fd
+        :param length: int
+            expected file size; skipped when unknown (<= 0)
+        """
+        if length > 0 and hasattr(os, "posix_fallocate"):
+            try:
+                os.posix_fallocate(out_file.fileno(), 0, length)
+            except OSError:
+                # fallocate is an optimization only; some filesystems
+                # (and fds) refuse it and the plain write path still works
+                pass
+
+    @staticmethod
+    def _drop_page_cache(path):
+        """
+        Tells the kernel the freshly written file will not be re-read
+        soon (POSIX_FADV_DONTNEED), so a multi-gigabyte archive does not
+        evict the pages the training run actually needs
+
+        :param path: str
+            file whose cached pages can be released
+        """
+        if not hasattr(os, "posix_fadvise"):
+            return
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
     
     def download(self, verbose = True):
         """ Download the dataset """
         self._download(self._source_url, self.download_url, self._getfilename(self._source_url), verbose=verbose )
     
+    @staticmethod
     def _get_filename(url):
         return url[url.rfind("/") + 1:]
     
@@ -268,14 +749,68 @@ class Dataset(object):
             retval = True
         return retval
     
+    def _open_gzip(self, gz_filepath):
+        """
+        Opens a gzip file for reading with rapidgzip when it is installed
+        so the Deflate stream is inflated on every core instead of one.
+        Returns None when rapidgzip is not available and the caller should
+        use the stdlib single threaded path
+
+        :param gz_filepath: str
+            path of the .gz file to open
+        :return: file object or None
+        """
+        if rapidgzip is None:
+            return None
+        return rapidgzip.RapidgzipFile(gz_filepath,
+                                       parallelization=os.cpu_count() or 1)
+
+    """ suffix-keyed registry of archive openers consulted before the
+    built-in dispatch.  Subclasses add formats without overriding
+    _extract: Dataset._OPENERS[".rar"] = lambda path: rarfile.RarFile(path)
+    — the opener gets the archive path and must return an object with an
+    extractall(folder) method """
+    _OPENERS = {}
+
+    """ leading bytes that identify each supported archive container,
+    checked in order by _sniff_format """
+    _MAGICS = ((b"PK\x03\x04", "zip"),
+               (b"\x1f\x8b", "gz"),
+               (b"\x28\xb5\x2f\xfd", "zst"),
+               (b"BZh", "bz2"),
+               (b"\xfd7zXZ", "xz"))
+
+    def _sniff_format(self, filepath):
+        """
+        Identifies the archive container from its leading bytes rather
+        than its suffix, so oddly named files still extract.  Falls back
+        to suffix checks when the bytes match nothing
+
+        :param filepath: str
+            path of the archive
+        :return: str or None
+            one of "zip", "gz", "zst", "bz2", "xz" or None for unknown
+        """
+        try:
+            with open(filepath, "rb") as archive_file:
+                head = archive_file.read(6)
+        except OSError:
+            head = b""
+        for magic, archive_format in self._MAGICS:
+            if head.startswith(magic):
+                return archive_format
+        if filepath.endswith(".zip"):
+            return "zip"
+        if filepath.endswith((".tar.gz", ".tgz", ".gz")):
+            return "gz"
+        return None
+
     def _extract(self, extract_filepath, extract_folder, verbose=True):
         """
-        Base class implementation Extracts zip and tar.gz or gzip files.
-        Subclasses can extend by adding
-       if (extn = ".new")
-            mysubclass_extract(...)
-        else:
-            super()._extract(extract_filepath, extract_folder)
+        Base class implementation Extracts zip, tar.{gz,bz2,xz,zst} and
+        plain gzip files, dispatching on the archive's magic bytes.
+        Subclasses extend by registering an opener instead of overriding:
+            Dataset._OPENERS[".new"] = lambda path: MyArchive(path)
 
         Parameters
         ----------
@@ -292,22 +827,184 @@ class Dataset(object):
         if verbose:
             print("Extracting " + extract_filepath + " ... ", end=" ")
 
-        if extract_filepath.endswith(".zip"):
-            # Unpack the zip-file.
-            zipfile.ZipFile(file=extract_filepath,
-                            mode="r").extractall(extract_folder)
-        elif extract_filepath.endswith((".tar.gz", ".tgz")):
-            # Unpack the tar-ball.
-            tarfile.open(name=extract_filepath,
-                         mode="r:gz").extractall(extract_folder)
-        # for the check_if_extracted to return True we add an empty .<filename>_extracted file to the folder.
-        marker_filename = os.path.join(extract_folder,
-                                       "."+self._get_filename(extract_filepath)+self.extract_marker)
+        # imported here rather than at module top so merely importing the
+        # package does not pay for the archive machinery
+        import tarfile
+        import zipfile
 
-        open(marker_filename, 'w').close()
+        opener_ext = next((ext for ext in self._OPENERS
+                           if extract_filepath.endswith(ext)), None)
+        archive_format = self._sniff_format(extract_filepath)
+        if opener_ext is not None:
+            # registered handlers win over the built-in formats
+            self._OPENERS[opener_ext](extract_filepath).extractall(extract_folder)
+        elif archive_format == "zip":
+            # Unpack the zip-file through an mmap: zip needs random
+            # access for the central directory, and mapped pages come
+            # straight from the page cache with no userspace copy per
+            # read. Falls back to the plain path where mmap fails
+            # (empty file, exotic filesystem)
+            import mmap
+            with open(extract_filepath, "rb") as archive_file:
+                try:
+                    mapped = mmap.mmap(archive_file.fileno(), 0,
+                                       access=mmap.ACCESS_READ)
+                except (ValueError, OSError):
+                    mapped = None
+                if mapped is not None:
+                    try:
+                        if hasattr(mapped, "madvise"):
+                            mapped.madvise(mmap.MADV_SEQUENTIAL)
+                        self._extract_zip_members(
+                            zipfile.ZipFile(file=_SeekableMmap(mapped),
+                                            mode="r"), extract_folder)
+                    finally:
+                        mapped.close()
+                else:
+                    self._extract_zip_members(
+                        zipfile.ZipFile(file=extract_filepath,
+                                        mode="r"), extract_folder)
+        elif archive_format == "gz" and extract_filepath.endswith((".tar.gz", ".tgz")):
+            # Unpack the tar-ball. rapidgzip inflates the gzip stream on
+            # all cores while stdlib gzip is single threaded, so prefer it
+            gz_file = self._open_gzip(extract_filepath)
+            if gz_file is not None:
+                with gz_file:
+                    tarfile.open(fileobj=gz_file,
+                                 mode="r|").extractall(extract_folder)
+            else:
+                # Streaming mode ("r|gz") reads the archive strictly
+                # forward, which skips the seekable _Stream buffer-slicing
+                # path of "r:gz" on interpreters before the bpo-34043 fix.
+                # extractall walks members in order so forward-only is fine
+                tarfile.open(name=extract_filepath,
+                             mode="r|gz", bufsize=1 << 20).extractall(extract_folder)
+        elif archive_format == "gz":
+            # Single gzipped file (e.g. MNIST idx files): decompress it
+            # next to the archive without the .gz suffix
+            out_path = os.path.join(extract_folder,
+                                    self._get_filename(extract_filepath)[:-3])
+            gz_file = self._open_gzip(extract_filepath)
+            if gz_file is None:
+                import gzip
+                gz_file = gzip.open(extract_filepath, "rb")
+            import shutil
+            with gz_file, open(out_path, "wb") as out_file:
+                shutil.copyfileobj(gz_file, out_file, length=1 << 20)
+        elif archive_format == "zst":
+            # zstd tarballs decompress a few times faster than gzip ones;
+            # zstandard is optional so fail loudly when it is missing
+            try:
+                import zstandard
+            except ImportError:
+                raise RuntimeError(
+                    "zstandard is needed to extract " + extract_filepath)
+            with open(extract_filepath, "rb") as archive_file:
+                with zstandard.ZstdDecompressor().stream_reader(archive_file) as stream:
+                    tarfile.open(fileobj=stream,
+                                 mode="r|").extractall(extract_folder)
+        elif archive_format == "bz2":
+            tarfile.open(name=extract_filepath,
+                         mode="r|bz2", bufsize=1 << 20).extractall(extract_folder)
+        elif archive_format == "xz":
+            tarfile.open(name=extract_filepath,
+                         mode="r|xz", bufsize=1 << 20).extractall(extract_folder)
+        self._write_extract_marker(extract_filepath, extract_folder)
         if verbose:
             print("Done")
 
+    def _extract_zip_members(self, zip_file, extract_folder):
+        """
+        Extracts every member of an open ZipFile after creating all the
+        unique parent directories in one pass.  extractall stats and
+        possibly mkdirs the same ancestors once per member, which on
+        many-file archives triples the syscall count; here it is one
+        makedirs per distinct directory and one open+copy per file
+
+        :param zip_file: zipfile.ZipFile
+            the open archive
+        :param extract_folder: str
+            folder the members are written into
+        """
+        import shutil
+        infos = zip_file.infolist()
+        root = os.path.realpath(extract_folder)
+        parents = {os.path.dirname(info.filename) for info in infos}
+        parents.update(info.filename for info in infos if info.is_dir())
+        for parent in sorted(parents, key=len):
+            if parent:
+                target = os.path.join(extract_folder, parent)
+                # same containment check as the file loop below: a
+                # member named ../x must not create directories outside
+                # the extract folder either
+                if not os.path.realpath(target).startswith(root + os.sep):
+                    raise RuntimeError("unsafe path in archive: " + parent)
+                os.makedirs(target, exist_ok=True)
+        for info in infos:
+            if info.is_dir():
+                continue
+            target = os.path.join(extract_folder, info.filename)
+            # refuse members that would escape the extract folder
+            if not os.path.realpath(target).startswith(root + os.sep):
+                raise RuntimeError("unsafe path in archive: " + info.filename)
+            with zip_file.open(info) as src, open(target, "wb") as dst:
+                shutil.copyfileobj(src, dst, length=1 << 20)
+            # restore the unix mode ZipFile.extract would have applied
+            # (high 16 bits of external_attr), or executables and
+            # scripts come out of the archive without their x bits
+            mode = info.external_attr >> 16
+            if mode:
+                os.chmod(target, mode)
+
+    def _write_size_marker(self, dwnld_path, size):
+        """
+        Records the expected byte count of a download in the
+        .<filename>_size marker checked by _check_if_downloaded.
+        Written before the transfer starts, so a killed run leaves a
+        marker that exposes the partial file as incomplete
+
+        :param dwnld_path: str
+            path the file is being downloaded to
+        :param size: int
+            expected final size; skipped when unknown (<= 0)
+        """
+        if size <= 0:
+            return
+        marker_filename = os.path.join(
+            os.path.dirname(dwnld_path),
+            "." + os.path.basename(dwnld_path) + self.size_marker)
+        tmp_marker = marker_filename + ".tmp"
+        with open(tmp_marker, "w") as marker_file:
+            marker_file.write(str(size))
+        os.replace(tmp_marker, marker_filename)
+
+    def _write_extract_marker(self, extract_filepath, extract_folder):
+        """
+        Records the archive's size and sha256 in the
+        .<filename>_extracted marker checked by check_if_extracted. The
+        write goes through a temp file + rename so a crash never leaves
+        a valid-looking marker
+
+        :param extract_filepath: str
+            path of the archive that was extracted
+        :param extract_folder: str
+            folder the archive was extracted into
+        """
+        marker_filename = os.path.join(extract_folder,
+                                       "."+self._get_filename(extract_filepath)+self.extract_marker)
+        try:
+            marker_content = "{0} {1}".format(
+                os.path.getsize(extract_filepath),
+                self._archive_digest(extract_filepath))
+        except OSError:
+            marker_content = ""
+        tmp_marker = marker_filename + ".tmp"
+        with open(tmp_marker, 'w') as marker_file:
+            marker_file.write(marker_content)
+        os.replace(tmp_marker, marker_filename)
+        # the folder contents changed, drop the cached listings
+        _listdir_set.cache_clear()
+
     def _download_and_extract(self, source_url: str, download_folder: str, filename: str, verbose: bool = True) -> bool:
         """
         Downloads the dataset from the download_url into the download_folder
@@ -331,20 +1028,153 @@ class Dataset(object):
             False: Nothing was done
         """
         retval=False
-        if not self._check_if_downloaded(source_url, download_folder, filename):
+        # download_folder is already the subfolder-resolved destination
+        # here, so the subfolder argument is empty
+        downloaded = self._check_if_downloaded(source_url, download_folder, "", filename)
+        extracted = self.check_if_extracted(source_url, download_folder, filename)
+
+        # when both the fetch and the extract are still ahead of us and
+        # the archive is a tarball we can stream the response straight
+        # into the extractor, so decompression runs during the transfer
+        # and wall time is max(download, extract) instead of the sum
+        if not downloaded and not extracted \
+                and filename.endswith((".tar.gz", ".tgz")) \
+                and self._stream_download_extract(source_url, download_folder,
+                                                  filename, verbose):
+            return True
+
+        if not downloaded:
             self._download(source_url, download_folder, filename, verbose)
             retval = True
-        if not self._check_if_extracted(source_url, download_folder, filename):
-            self._extract(os.path.join(download_folder, filename), download_folder, verbose)
+        if not extracted:
+            archive_path = os.path.join(download_folder, filename)
+            self._extract(archive_path, download_folder, verbose)
+            # the marker hash inside _extract was the archive's last
+            # reader, so its cached pages can go now.  Only real
+            # archives are dropped: a plain data file is the thing the
+            # loader is about to read
+            if self._sniff_format(archive_path) is not None:
+                self._drop_page_cache(archive_path)
             retval = True
 
         return retval
 
+    def _stream_download_extract(self, source_url, download_folder, filename,
+                                 verbose=True):
+        """
+        Downloads a tarball and extracts it in one pass: the HTTP
+        response is fed to a streaming tarfile reader while a tee writes
+        the same bytes to the archive on disk, so the download checks and
+        the extract marker still work on later runs.  Uses the pooled
+        http client when available and plain urlopen otherwise; needs a
+        web source
+
+        :param source_url: str
+            URL where the dataset is downloaded from
+        :param download_folder: str
+            folder where the dataset needs to be downloaded
+        :param filename: str
+            the tarball to fetch
+        :param verbose: bool
+            Displays progress messages
+        :return: bool
+            True when the streamed path ran, False when the caller
+            should fall back to download-then-extract
+        """
+        if filename != "":
+            url_req = os.path.join(source_url, filename)
+        else:
+            url_req = source_url
+        if not self._is_web_url(url_req):
+            return False
+
+        import tarfile
+        os.makedirs(download_folder, exist_ok=True)
+        dwnld_path = os.path.join(download_folder, filename)
+        if verbose:
+            print("Downloading and extracting", filename, end=" ")
+
+        pool = self._get_pool()
+        if pool is not None:
+            response = pool.request("GET", url_req, preload_content=False)
+            release = response.release_conn
+        else:
+            # no urllib3: urlopen still gives us a streamable response
+            import urllib.request
+            response = urllib.request.urlopen(url_req)
+            release = response.close
+        # urlopen raises on HTTP errors itself, urllib3 does not: with
+        # no check a 404 page would be teed to disk as the archive
+        if response.status >= 400:
+            release()
+            raise RuntimeError("HTTP %d fetching %s"
+                               % (response.status, url_req))
+        total_size = int(response.headers.get("Content-Length", -1))
+        self._write_size_marker(dwnld_path, total_size)
+        progress = None
+        if verbose:
+            # the tee reports a running byte count, so block_size is 1
+            hook = self._make_progress_hook(total_size)
+            if hook is not None:
+                progress = lambda n: hook(n, 1)
+        try:
+            with open(dwnld_path, "wb") as out_file:
+                self._preallocate(out_file, total_size)
+                tee = _TeeReader(response, out_file, progress)
+                tarfile.open(fileobj=tee,
+                             mode="r|gz").extractall(download_folder)
+                tee.drain()
+        except Exception:
+            # the half-teed archive has no extract marker but would
+            # still pass the presence check; remove it so the next run
+            # restarts the transfer
+            try:
+                os.unlink(dwnld_path)
+            except OSError:
+                pass
+            raise
+        finally:
+            release()
+        self._write_extract_marker(dwnld_path, download_folder)
+        # the marker above has hashed the archive, nothing reads it again
+        # until the next staleness check
+        self._drop_page_cache(dwnld_path)
+        if verbose:
+            print("Done!")
+        return True
+
     def _clean_downloaded_folders(self):
         """
-        cleans up all the folders that
+        cleans up all the downloaded folders. unlink is syscall-bound, so
+        for big extracted trees the files of each folder are removed by a
+        thread pool and the folders dropped bottom-up; Windows keeps the
+        serial shutil.rmtree
         """
-        shutil.rmtree(self._download_url)
+        if os.name == "nt":
+            import shutil
+            shutil.rmtree(self._download_url)
+            return
+        if not os.path.isdir(self._download_url):
+            # keep the shutil.rmtree contract this replaced: a missing
+            # folder is an error, not a silent no-op
+            raise FileNotFoundError(
+                "no such download folder: " + self._download_url)
+        with ThreadPoolExecutor(max_workers=32) as executor:
+            for root, dirs, files in os.walk(self._download_url,
+                                             topdown=False):
+                if files:
+                    list(executor.map(
+                        os.unlink,
+                        [os.path.join(root, name) for name in files]))
+                # os.walk reports symlinked directories but never
+                # descends into them, so unlink the link itself (tar
+                # archives produce these) or rmdir below gets ENOTEMPTY
+                for name in dirs:
+                    child = os.path.join(root, name)
+                    if os.path.islink(child):
+                        os.unlink(child)
+                os.rmdir(root)
+        _listdir_set.cache_clear()
 
     def download_extract_if_needed(self, verbose=True):
         """
@@ -372,31 +1202,81 @@ class Dataset(object):
             subfolders = [self._train_subfolder, self._validate_subfolder, self._test_subfolder]
             data_flags = [self._train_data_present, self._validate_data_present, self._test_data_present]
 
-            download_folder = ""
+            # Collect every file that needs fetching first, then dispatch
+            # them together.  The downloads are independent network-bound
+            # tasks so running them in a thread pool overlaps their
+            # latencies instead of paying them one after the other
+            tasks = []
             for file_name, label, subfolder, data_flag in zip(fnames, labels, subfolders,data_flags):  # type: (str, str, str, bool)
                 if subfolder != "":
                     download_folder = os.path.join(self._download_url, subfolder)
+                else:
+                    download_folder = self._download_url
 
-                if data_flag:  # if data is present
-                    # check if data is already downloaded
-                    if not self._check_if_downloaded(self._source_url, self._download_url, subfolder, file_name):
-                        self._downloa_trainingd_and_extract(self._source_url, download_folder, file_name)
+                # slots whose filename is empty (the defaults for the
+                # validate/test splits on many datasets) have nothing
+                # to fetch and must not become a task, or dwnld_path
+                # degenerates to the folder itself
+                if data_flag and file_name != "":
+                    # enqueue when either half of the work is missing:
+                    # a file that is on disk but was never extracted
+                    # (what a killed run leaves behind) still needs
+                    # _download_and_extract, which skips the parts that
+                    # are already done
+                    if (not self._check_if_downloaded(
+                            self._source_url, self._download_url,
+                            subfolder, file_name)
+                            or not self.check_if_extracted(
+                                self._source_url, download_folder,
+                                file_name)):
+                        tasks.append((self._source_url, download_folder, file_name))
                         # if labels are in a separate file download them
                         if label != "":
-                            self._download_and_extract(self._source_url, download_folder, label)
-                self._download_and_extract(download_folder, self._source_url, file_name, verbose)
+                            tasks.append((self._source_url, download_folder, label))
+
+            if tasks:
+                for _, folder, _ in tasks:
+                    os.makedirs(folder, exist_ok=True)
+                # a single file keeps its progress bar; concurrent ones
+                # would interleave \r updates on the same line, so the
+                # per-file bars go quiet when several files are in flight
+                file_verbose = verbose and len(tasks) == 1
+                with ThreadPoolExecutor(
+                        max_workers=min(6, len(tasks))) as executor:
+                    list(executor.map(
+                        lambda args: self._download_and_extract(*args, verbose=file_verbose),
+                        tasks))
         self._downloaded = True
 
 
     def refresh(self, verbose=True):
         """
-        Downloads the dataset from the source_url even if it was previously 
+        Downloads the dataset from the source_url even if it was previously
         downloaded.
-        Base class implementation cleans up the download_url passed in the 
+        Base class implementation cleans up the download_url passed in the
         constructor.  Subclasses can add additional implementation
-        
+
+        The old tree is renamed out of the way (one cheap syscall) and
+        deleted by a background thread while the new download runs, so
+        refresh costs max(delete, download) instead of their sum
         """
-        self._clean_downloaded_folders()
+        if os.path.isdir(self._download_url):
+            import shutil
+            import threading
+            # normpath strips a trailing separator, without which the
+            # default "./data/" builds "./data/.old-..." - a rename
+            # into the directory itself that fails with EINVAL
+            live_path = os.path.normpath(self._download_url)
+            old_path = live_path + ".old-" + str(int(time.time()))
+            os.rename(live_path, old_path)
+            _listdir_set.cache_clear()
+            # daemon so an exiting interpreter never blocks on the
+            # delete; ignore_errors because a half-removed stale tree
+            # is harmless
+            threading.Thread(target=shutil.rmtree,
+                             args=(old_path,),
+                             kwargs={"ignore_errors": True},
+                             daemon=True).start()
         self._downloaded = False
         self.download_extract_if_needed(verbose)
     def introduction(self):
@@ -409,25 +1289,102 @@ class InMemDataset(Dataset):
     """
     InMemory dataset can be downloaded/extracted and loaded in memory if the size is small enough
     to fit in memory. The dataset is presented in a numpy array for convenience of other modules
+
+    Subclasses joining separate data and label files should go through
+    _merge_labels and keep per-row work out of Python: never use
+    DataFrame.apply(axis=1) or a for loop over rows, both of which fall
+    off the vectorized C path
     """
+    __slots__ = ("_dataset", "_dtype_policy")
     
     """ the in memory data"""
 
-    def __init__(self, source_url, download_path,
+    def __init__(self, source_url, download_path="./data/",
              train_data_filename="", validate_data_filename="", test_data_filename="",
-             trail_labels_filename="", validate_labels_filename="", test_labels_filename="",
+             train_labels_filename="", validate_labels_filename="", test_labels_filename="",
              train_subfolder="train", validate_subfolder="validate", test_subfolder="test",
+             train_data_present=True, validate_data_present=True, test_data_present=True,
              uncompress=True, verbose=True,
-             refresh_everytime_used=False, already_downloaded=False):
+             refresh_everytime_used=False, already_downloaded=False,
+             dtype_policy=None):
         """
         Constructor that initializes the InMemDataset
-        Params
+        Params are the same as the Dataset base class, plus
+
+        :param dtype_policy: callable
+            hook applied to the frame right after it is parsed, used to
+        narrow or quantize columns.  Narrowing is lossy, so the default
+        None keeps whatever the parser inferred; pass DTYPE_FP32
+        (float64 to float32, smallest fitting ints), DTYPE_FP16 or
+        DTYPE_INT8_QUANT to opt in, trading precision for footprint
+        """
+        super().__init__(
+            source_url=source_url,
+            download_url=download_path,
+            train_data_filename=train_data_filename,
+            validate_data_filename=validate_data_filename,
+            test_data_filename=test_data_filename,
+            train_labels_filename=train_labels_filename,
+            validate_labels_filename=validate_labels_filename,
+            test_labels_filename=test_labels_filename,
+            train_subfolder=train_subfolder,
+            validate_subfolder=validate_subfolder,
+            test_subfolder=test_subfolder,
+            train_data_present=train_data_present,
+            validate_data_present=validate_data_present,
+            test_data_present=test_data_present,
+            extract=uncompress,
+            refresh_everytime_used=refresh_everytime_used,
+            already_downloaded=already_downloaded)
+        self._dataset = None
+        self._dtype_policy = dtype_policy
+
+    def _apply_dtype_policy(self, df):
         """
-        self._dataset = None;
+        Runs the frame through the dtype policy chosen in the
+        constructor, or returns it untouched when the policy is None
+
+        :param df: pandas.DataFrame
+        :return: pandas.DataFrame
+        """
+        if self._dtype_policy is None:
+            return df
+        return self._dtype_policy(df)
     def load(self):
         """
         Loads the dataset onto the memory, to be implemented in the sub classes
         """
 
+    def _merge_labels(self, data_df, labels_df, on=None):
+        """
+        Joins a labels frame onto a data frame row-wise using the
+        vectorized pandas join instead of per-row Python
+
+        :param data_df: pandas.DataFrame
+            the samples
+        :param labels_df: pandas.DataFrame
+            the labels, aligned by index or by the on column
+        :param on: str
+            column to join on; when None the frames are joined on
+            their indexes
+        :return: pandas.DataFrame
+        """
+        if on is None:
+            return data_df.join(labels_df, how="left")
+        return data_df.join(labels_df.set_index(on), on=on, how="left")
+
+    def _to_soa(self):
+        """
+        Returns the loaded dataset as a dict of column name to numpy
+        array (structure of arrays).  Handy for consumers that want flat
+        contiguous arrays, e.g. numba kernels
+
+        :return: dict of str to numpy.ndarray
+        """
+        if self._dataset is None:
+            return {}
+        return {name: column.to_numpy()
+                for name, column in self._dataset.items()}
+
     def _getDataSet(self):
         return self._dataset
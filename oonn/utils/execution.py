@@ -15,12 +15,16 @@ later performing any post-processing steps can be defined using these classes
 import logging
 import sys
 
-from .counter import Counter
+log = logging.getLogger(__name__)
 
 class Task(object) :
     """
-    Base class for all Tasks that need to be executed in a Process object.  
-    """    
+    Base class for all Tasks that need to be executed in a Process object.
+    __slots__ keeps each task at three slot pointers instead of a full
+    per-instance __dict__, which matters for processes holding thousands
+    of tasks
+    """
+    __slots__ = ("_task_id", "_task_name", "_id_str")
     def __init(self):
         """
         Null Constructor initializing the object
@@ -33,6 +37,7 @@ class Task(object) :
         """
         self._task_id = task_id
         self._task_name = task_name
+        self._id_str = str(task_id)
     def set_id(self, task_id):
         """
         Set the id of this Task
@@ -48,8 +53,11 @@ class Task(object) :
         None
       
         """
-      
+
         self._task_id = task_id
+        # str(id) is rendered once here so the logging calls on the
+        # execute hot path never rebuild it
+        self._id_str = str(task_id)
     def get_id(self):
         """
         Get the id of this Task
@@ -108,7 +116,8 @@ class Task(object) :
         Task name of the task added to the list
       
         """
-        logging.info("Executing Task with ID: " +str(self.get_id() ) + " and Name: "+ self.get_name() )
+        log.info("Executing Task with ID: %s and Name: %s",
+                 self._id_str, self._task_name)
     
 class Process(Task): 
     """
@@ -119,19 +128,20 @@ class Process(Task):
     While the above being the intent for this class, it could be used for
     other purposes
     """
+    __slots__ = ("_tasks", "_continue_with_errors")
     def __init__(self):
         """
         Constructor for process to initiate the list of tasks.
-          Each task is contains a subclass of Task in a dictionary 
-          where the key is the task_id
-        
+          Each task contains a subclass of Task in a list where the
+          task_id is the list index, so adding is an append with no key
+          hashing and execution walks the list in order
+
         Parameters
         ----------
         None
-        
+
         """
-        self._tasks={}
-        self._task_id_counter = Counter()
+        self._tasks = []
         self.set_name("Process")
         self._continue_with_errors = True
 
@@ -152,9 +162,9 @@ class Process(Task):
         """
         __task_id = 0
         if (isinstance(task, Task)):
-            __task_id = self._task_id_counter.next()
+            __task_id = len(self._tasks)
             task.set_id(__task_id)
-            self._tasks[__task_id]=task
+            self._tasks.append(task)
         return __task_id
         
     def pop_task(self, task_id):
@@ -167,11 +177,13 @@ class Process(Task):
         
         """
         __ret_task = object()
-        if task_id in self._tasks:
+        if 0 <= task_id < len(self._tasks) and self._tasks[task_id] is not None:
             __ret_task = self._tasks[task_id]
-            del self._tasks[task_id]
+            # tombstone instead of del so the remaining ids stay equal to
+            # their list index
+            self._tasks[task_id] = None
         else:
-            logging.error(str(task_id)+ "not found in the task list")
+            log.error("%s not found in the task list", task_id)
         return __ret_task
     
     def execute(self):
@@ -179,22 +191,29 @@ class Process(Task):
         Execute the list of tasks inside the process
         
         """
-        for _i in range(self._task_id_counter.current()+1):
-            if _i in self._tasks:
-                current_task = self._tasks[_i]
-                try:
-                    current_task.execute()
-                except:
-                    logging.error(sys.exc_info())
-                    logging.error("ERROR: Executing "+current_task.get_name()+ 
-                                  " with Id "+str(current_task.get_id() ) )
-                    if self._continue_with_errors:
-                        continue
-                    else:
-                        return
-                finally:
-                    logging.info("Completed Execution of Task with Name: "+
-                                 current_task.get_name() +" and Id: "+ str(current_task.get_id() ) )
+        # the list iterates in insertion order with optimal locality;
+        # entries tombstoned by pop_task are skipped
+        for current_task in self._tasks:
+            if current_task is None:
+                continue
+            try:
+                current_task.execute()
+                # success log inside the try, not a finally: a finally
+                # would also announce completion for tasks that just
+                # raised, putting a misleading second record after the
+                # traceback.  Guarded so neither the get_name call nor
+                # the dispatch happens per task when INFO is off
+                if log.isEnabledFor(logging.INFO):
+                    log.info("Completed Execution of Task with Name: %s and Id: %s",
+                             current_task.get_name(), current_task._id_str)
+            except Exception:
+                # Exception (not bare except) so KeyboardInterrupt and
+                # SystemExit still propagate; log.exception records the
+                # active traceback without the sys.exc_info() tuple
+                log.exception("ERROR: Executing %s with Id %s",
+                              current_task.get_name(), current_task._id_str)
+                if not self._continue_with_errors:
+                    return
                     
                 
                 